@@ -2,24 +2,161 @@ import streamlit as st
 import os
 import tempfile
 import time
-from PIL import Image
-import requests
-from io import BytesIO
+import uuid
+from collections import deque
 
-from audio_processor import AudioProcessor
+from audio_processor import (
+    AudioProcessor,
+    DEFAULT_TRANSCRIPTION_LANGUAGE,
+    RECORDING_FILENAME,
+    TRANSCRIPTION_LANGUAGES,
+    WHISPER_MAX_FILE_BYTES,
+    WHISPER_SAMPLE_RATE,
+)
 from image_generator import ImageGenerator
 from content_moderator import ContentModerator
-from utils import save_audio_file, display_error, log_message
+from pipeline import moderate_and_generate
+from utils import (
+    display_error,
+    encode_image,
+    encode_thumbnail,
+    format_file_size,
+    hash_bytes,
+    log_message,
+    normalize_prompt,
+    run_coroutine,
+    run_in_background,
+)
+
+# Shared service instances (one per server process, reused by every session)
+@st.cache_resource
+def get_audio_processor():
+    return AudioProcessor()
+
+@st.cache_resource
+def get_image_generator():
+    return ImageGenerator()
+
+@st.cache_resource
+def get_content_moderator():
+    return ContentModerator()
+
+class UncachedResult(Exception):
+    """Carries a result out of a cached function without Streamlit memoising it"""
+    def __init__(self, value):
+        super().__init__(value)
+        self.value = value
+
+def call_cached(func, *args):
+    """Call a cached function, returning any UncachedResult value it raised"""
+    try:
+        return func(*args)
+    except UncachedResult as e:
+        return e.value
+
+# Identical audio is only sent to Whisper once; failed transcriptions are not cached.
+# The leading underscore keeps Streamlit from hashing the raw audio, the digest is the key.
+@st.cache_data(show_spinner=False, max_entries=64)
+def transcribe_cached(audio_digest, _audio_bytes, filename, language):
+    transcribed_text = get_audio_processor().speech_to_text_bytes(_audio_bytes, filename, language)
+    if transcribed_text is None:
+        raise UncachedResult(None)
+    return transcribed_text
+
+# Repeated prompts reuse the first generation instead of paying for DALL-E again.
+# Keyed on the session and the normalized prompt, so one user's images are never
+# served to another; the TTL stays under the one-hour lifetime of DALL-E URLs.
+@st.cache_data(show_spinner=False, max_entries=256, ttl=50 * 60)
+def generate_image_cached(session_id, prompt_key, _prompt, size="1024x1024", quality="standard"):
+    image_result = get_image_generator().generate_image(_prompt, size, quality)
+    if not image_result['success']:
+        raise UncachedResult(image_result)
+    return image_result
+
+# Audio file types accepted by the uploader
+UPLOAD_AUDIO_TYPES = ['wav', 'mp3', 'm4a', 'ogg']
+
+# Gallery thumbnails are rendered at this width instead of shipping full-size images
+GALLERY_THUMBNAIL_SIZE = 384
+
+# Gallery history limits (adjustable in the Settings tab)
+DEFAULT_MAX_HISTORY = 50
+DEFAULT_HISTORY_TTL_MINUTES = 30
+
+def new_image_history(images=()):
+    """Create a bounded gallery history that drops the oldest images first"""
+    return deque(images, maxlen=st.session_state.get('max_history', DEFAULT_MAX_HISTORY))
+
+def resize_image_history():
+    st.session_state.generated_images = new_image_history(st.session_state.generated_images)
+
+def evict_expired_images():
+    """Drop gallery images older than the configured time-to-live"""
+    ttl_seconds = st.session_state.get('history_ttl_minutes', DEFAULT_HISTORY_TTL_MINUTES) * 60
+    cutoff = time.time() - ttl_seconds
+    images = st.session_state.generated_images
+    while images and images[0]['timestamp'] < cutoff:
+        images.popleft()
 
 # Initialize session state
 if 'generated_images' not in st.session_state:
-    st.session_state.generated_images = []
-if 'audio_processor' not in st.session_state:
-    st.session_state.audio_processor = AudioProcessor()
-if 'image_generator' not in st.session_state:
-    st.session_state.image_generator = ImageGenerator()
-if 'content_moderator' not in st.session_state:
-    st.session_state.content_moderator = ContentModerator()
+    st.session_state.generated_images = new_image_history()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Rendered as a fragment so gallery interactions (18+ filter, full-resolution toggles)
+# rerun only the gallery instead of the whole app
+@st.fragment
+def render_gallery():
+    st.header("Generated Image Gallery")
+    
+    evict_expired_images()
+    
+    if st.session_state.generated_images:
+        st.write(f"Total images: {len(st.session_state.generated_images)}")
+        
+        # Filter options
+        show_adult_content = st.checkbox("🔞 Show 18+ content", value=False)
+        
+        # Display images in reverse chronological order
+        for idx, image_data in enumerate(reversed(st.session_state.generated_images)):
+            # Skip adult content if filter is enabled
+            if image_data['moderation']['is_adult_content'] and not show_adult_content:
+                continue
+            
+            with st.expander(f"Image {len(st.session_state.generated_images) - idx}: {image_data['prompt'][:50]}..."):
+                col1, col2 = st.columns([2, 1])
+                
+                with col1:
+                    if image_data['moderation']['is_adult_content']:
+                        st.warning("🔞 **18+ Content Warning**")
+                    
+                    # Only the small thumbnail is sent on every rerun; the full image
+                    # is streamed to the browser once the user asks for it
+                    st.image(image_data['thumbnail_bytes'], width=GALLERY_THUMBNAIL_SIZE)
+                    if st.toggle("Show full resolution", key=f"full_res_{image_data['timestamp']}"):
+                        st.image(image_data['image_bytes'], use_container_width=True)
+                
+                with col2:
+                    st.write("**Prompt:**")
+                    st.write(image_data['prompt'])
+                    st.write("**Generated:**")
+                    st.write(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(image_data['timestamp'])))
+                    
+                    if image_data['moderation']['is_adult_content']:
+                        st.write("**Content Rating:** 18+")
+                    else:
+                        st.write("**Content Rating:** General")
+                    
+                    st.download_button(
+                        "⬇️ Download",
+                        data=image_data['image_bytes'],
+                        file_name=f"image_{int(image_data['timestamp'])}.webp",
+                        mime="image/webp",
+                        key=f"download_{image_data['timestamp']}"
+                    )
+    else:
+        st.info("📭 No images generated yet. Use the 'Record & Generate' tab to create your first image!")
 
 def main():
     st.title("🎤 Speech-to-Image Generator")
@@ -37,7 +174,7 @@ def main():
         st.header("Record Audio")
         
         # Check microphone availability
-        microphone_available = st.session_state.audio_processor.microphone_available
+        microphone_available = get_audio_processor().microphone_available
         
         if not microphone_available:
             st.warning("⚠️ Microphone not available in this environment. Please upload an audio file instead.")
@@ -46,23 +183,58 @@ def main():
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            record_button_disabled = not microphone_available
-            if st.button("🎤 Start Recording", type="primary", disabled=record_button_disabled):
-                with st.spinner("Recording... Speak now!"):
-                    # Record audio for 5 seconds (can be adjusted)
-                    audio_data = st.session_state.audio_processor.record_audio(duration=5)
-                    if audio_data:
-                        st.success("✅ Recording completed!")
-                        st.session_state.recorded_audio = audio_data
+            recording = st.session_state.get('active_recording')
+            
+            if recording is None:
+                record_button_disabled = not microphone_available
+                if st.button("🎤 Start Recording", type="primary", disabled=record_button_disabled):
+                    # Record audio for up to 5 seconds (can be adjusted) on a background thread
+                    recording = get_audio_processor().start_recording(duration=5, sample_rate=WHISPER_SAMPLE_RATE)
+                    if recording:
+                        st.session_state.active_recording = recording
+                        st.rerun()
                     else:
                         st.error("❌ Failed to record audio. Please check your microphone.")
+            else:
+                # Clicking Stop reruns the script, which lands back here and ends the capture
+                if st.button("⏹️ Stop Recording"):
+                    recording.stop()
+                
+                progress_bar = st.progress(0.0, text="Recording... Speak now!")
+                while recording.is_recording:
+                    progress_bar.progress(recording.progress, text="Recording... Speak now!")
+                    time.sleep(0.1)
+                progress_bar.empty()
+                
+                del st.session_state.active_recording
+                audio_data = recording.result()
+                if audio_data and recording.is_silent:
+                    # Skip the Whisper call entirely for silent clips
+                    st.warning("🔇 No speech detected. Please try again and speak closer to the microphone.")
+                elif audio_data:
+                    st.success("✅ Recording completed!")
+                    st.session_state.recorded_audio = audio_data
+                    st.session_state.recorded_audio_name = RECORDING_FILENAME
+                else:
+                    st.error("❌ Failed to record audio. Please check your microphone.")
         
         with col2:
             # Upload audio file option
-            uploaded_file = st.file_uploader("Or upload an audio file", type=['wav', 'mp3', 'm4a', 'ogg'])
+            uploaded_file = st.file_uploader("Or upload an audio file", type=UPLOAD_AUDIO_TYPES)
             if uploaded_file is not None:
-                st.session_state.recorded_audio = uploaded_file.read()
-                st.success("✅ Audio file uploaded!")
+                # Reject oversized files before pulling them into session state
+                if uploaded_file.size > WHISPER_MAX_FILE_BYTES:
+                    st.error(
+                        f"❌ File is too large ({format_file_size(uploaded_file.size)}). "
+                        f"Please upload audio under {format_file_size(WHISPER_MAX_FILE_BYTES)}."
+                    )
+                else:
+                    # Copy the upload only once, not on every rerun
+                    if st.session_state.get('uploaded_file_id') != uploaded_file.file_id:
+                        st.session_state.recorded_audio = uploaded_file.getvalue()
+                        st.session_state.recorded_audio_name = uploaded_file.name
+                        st.session_state.uploaded_file_id = uploaded_file.file_id
+                    st.success("✅ Audio file uploaded!")
         
         # Process recorded audio
         if hasattr(st.session_state, 'recorded_audio'):
@@ -71,22 +243,28 @@ def main():
             if st.button("🔄 Convert Speech to Text"):
                 with st.spinner("Converting speech to text..."):
                     try:
-                        # Save audio to temporary file
-                        temp_audio_path = save_audio_file(st.session_state.recorded_audio)
-                        
-                        # Convert speech to text
-                        transcribed_text = st.session_state.audio_processor.speech_to_text(temp_audio_path)
+                        # Convert speech to text straight from the in-memory audio
+                        audio_bytes = st.session_state.recorded_audio
+                        transcribed_text = call_cached(
+                            transcribe_cached,
+                            hash_bytes(audio_bytes),
+                            audio_bytes,
+                            st.session_state.get('recorded_audio_name', 'audio.wav'),
+                            st.session_state.get('transcription_language', DEFAULT_TRANSCRIPTION_LANGUAGE)
+                        )
                         
                         if transcribed_text:
                             st.session_state.transcribed_text = transcribed_text
+                            # Start moderating the transcript while the user reviews it
+                            st.session_state.pending_moderation = (
+                                transcribed_text,
+                                run_in_background(get_content_moderator().moderate_text, transcribed_text)
+                            )
                             st.success("✅ Speech converted to text successfully!")
                             st.text_area("Transcribed Text:", value=transcribed_text, height=100)
                         else:
                             st.error("❌ Could not transcribe audio. Please try again with clearer speech.")
                         
-                        # Clean up temporary file
-                        os.unlink(temp_audio_path)
-                        
                     except Exception as e:
                         st.error(f"❌ Error during speech-to-text conversion: {str(e)}")
                         log_message(f"Speech-to-text error: {str(e)}")
@@ -103,6 +281,12 @@ def main():
                 key="image_prompt"
             )
             
+            enhance_prompt = st.checkbox(
+                "✨ Enhance prompt with AI",
+                value=False,
+                help="Rewrite the prompt with artistic detail before generating (runs alongside moderation)"
+            )
+            
             col1, col2 = st.columns([1, 1])
             
             with col1:
@@ -110,28 +294,55 @@ def main():
                     if text_to_generate.strip():
                         with st.spinner("Generating image... This may take a moment."):
                             try:
-                                # Check content moderation first
-                                moderation_result = st.session_state.content_moderator.moderate_text(text_to_generate)
+                                if enhance_prompt:
+                                    # Moderate and enhance concurrently, then generate from the enhanced prompt
+                                    pipeline_result = run_coroutine(moderate_and_generate(
+                                        text_to_generate, get_content_moderator(), get_image_generator()
+                                    ))
+                                    moderation_result = pipeline_result['moderation']
+                                    image_result = pipeline_result['image']
+                                    generated_prompt = pipeline_result['prompt']
+                                    if moderation_result['is_safe']:
+                                        st.info(f"✨ Enhanced prompt: {generated_prompt}")
+                                else:
+                                    generated_prompt = text_to_generate
+                                    
+                                    # Check content moderation first, reusing the prefetched
+                                    # verdict if the prompt was not edited
+                                    pending = st.session_state.get('pending_moderation')
+                                    if pending and pending[0] == text_to_generate:
+                                        moderation_result = pending[1].result()
+                                    else:
+                                        moderation_result = get_content_moderator().moderate_text(text_to_generate)
+                                    
+                                    if moderation_result['is_safe']:
+                                        # Generate image
+                                        image_result = call_cached(
+                                            generate_image_cached,
+                                            st.session_state.session_id,
+                                            normalize_prompt(text_to_generate),
+                                            text_to_generate
+                                        )
                                 
                                 if not moderation_result['is_safe']:
                                     st.error(f"❌ Content blocked: {moderation_result['reason']}")
                                     st.warning("🔞 This content is not appropriate for image generation.")
                                 else:
-                                    # Generate image
-                                    image_result = st.session_state.image_generator.generate_image(text_to_generate)
-                                    
                                     if image_result['success']:
-                                        # Download and display image
-                                        response = requests.get(image_result['url'])
-                                        image = Image.open(BytesIO(response.content))
+                                        # Moderate the generated image by URL while downloading it for display
+                                        image_moderation_future = run_in_background(
+                                            get_content_moderator().moderate_image_url, image_result['url']
+                                        )
+                                        image = get_image_generator().download_image(image_result['url'])
+                                        image_moderation = image_moderation_future.result()
                                         
-                                        # Moderate the generated image
-                                        image_moderation = st.session_state.content_moderator.moderate_image(image)
-                                        
-                                        # Store in session state
+                                        # Store compressed bytes rather than the decoded image
                                         image_data = {
-                                            'image': image,
-                                            'prompt': text_to_generate,
+                                            'image_bytes': encode_image(image),
+                                            'thumbnail_bytes': encode_thumbnail(
+                                                image, (GALLERY_THUMBNAIL_SIZE, GALLERY_THUMBNAIL_SIZE)
+                                            ),
+                                            'prompt': generated_prompt,
                                             'timestamp': time.time(),
                                             'moderation': image_moderation
                                         }
@@ -143,7 +354,7 @@ def main():
                                         if image_moderation['is_adult_content']:
                                             st.warning("🔞 **18+ Content Warning**: This image may contain mature content.")
                                         
-                                        st.image(image, caption=f"Generated from: '{text_to_generate}'", use_column_width=True)
+                                        st.image(image, caption=f"Generated from: '{generated_prompt}'", use_container_width=True)
                                         
                                     else:
                                         st.error(f"❌ Failed to generate image: {image_result['error']}")
@@ -157,49 +368,18 @@ def main():
             with col2:
                 if st.button("🗑️ Clear All Data"):
                     # Clear session state
-                    for key in ['recorded_audio', 'transcribed_text', 'generated_images']:
+                    for key in ['recorded_audio', 'recorded_audio_name', 'uploaded_file_id', 'transcribed_text',
+                                'pending_moderation', 'generated_images', 'session_id']:
                         if key in st.session_state:
                             del st.session_state[key]
-                    st.session_state.generated_images = []
+                    st.session_state.generated_images = new_image_history()
+                    # A new id also stops this session reusing its earlier cached generations
+                    st.session_state.session_id = uuid.uuid4().hex
                     st.success("✅ All data cleared!")
                     st.rerun()
     
     with tab2:
-        st.header("Generated Image Gallery")
-        
-        if st.session_state.generated_images:
-            st.write(f"Total images: {len(st.session_state.generated_images)}")
-            
-            # Filter options
-            show_adult_content = st.checkbox("🔞 Show 18+ content", value=False)
-            
-            # Display images in reverse chronological order
-            for idx, image_data in enumerate(reversed(st.session_state.generated_images)):
-                # Skip adult content if filter is enabled
-                if image_data['moderation']['is_adult_content'] and not show_adult_content:
-                    continue
-                
-                with st.expander(f"Image {len(st.session_state.generated_images) - idx}: {image_data['prompt'][:50]}..."):
-                    col1, col2 = st.columns([2, 1])
-                    
-                    with col1:
-                        if image_data['moderation']['is_adult_content']:
-                            st.warning("🔞 **18+ Content Warning**")
-                        
-                        st.image(image_data['image'], use_column_width=True)
-                    
-                    with col2:
-                        st.write("**Prompt:**")
-                        st.write(image_data['prompt'])
-                        st.write("**Generated:**")
-                        st.write(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(image_data['timestamp'])))
-                        
-                        if image_data['moderation']['is_adult_content']:
-                            st.write("**Content Rating:** 18+")
-                        else:
-                            st.write("**Content Rating:** General")
-        else:
-            st.info("📭 No images generated yet. Use the 'Record & Generate' tab to create your first image!")
+        render_gallery()
     
     with tab3:
         st.header("Settings & Information")
@@ -207,6 +387,34 @@ def main():
         st.subheader("🔧 Configuration")
         st.write("**OpenAI API Status:**", "✅ Connected" if os.getenv("OPENAI_API_KEY") else "❌ Not configured")
         
+        st.selectbox(
+            "Spoken language",
+            options=list(TRANSCRIPTION_LANGUAGES),
+            index=list(TRANSCRIPTION_LANGUAGES).index(DEFAULT_TRANSCRIPTION_LANGUAGE),
+            format_func=TRANSCRIPTION_LANGUAGES.get,
+            key="transcription_language",
+            help="Telling Whisper the language skips its detection step; choose Auto-detect for mixed input"
+        )
+        
+        st.subheader("🗂️ Gallery History")
+        st.slider(
+            "Maximum images kept",
+            min_value=5,
+            max_value=200,
+            value=DEFAULT_MAX_HISTORY,
+            key="max_history",
+            on_change=resize_image_history,
+            help="Oldest images are dropped once the gallery is full"
+        )
+        st.slider(
+            "Keep images for (minutes)",
+            min_value=5,
+            max_value=240,
+            value=DEFAULT_HISTORY_TTL_MINUTES,
+            key="history_ttl_minutes",
+            help="Images older than this are removed from the gallery"
+        )
+        
         st.subheader("ℹ️ How it works")
         st.write("""
         1. **Record Audio**: Click 'Start Recording' to capture 5 seconds of audio from your microphone
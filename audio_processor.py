@@ -1,31 +1,56 @@
 import speech_recognition as sr
 import pyaudio
-import wave
-import tempfile
+import numpy as np
+import soundfile as sf
+import io
+import mimetypes
 import os
-from openai import OpenAI
+import queue
+import threading
+from openai_client import get_client
 from utils import log_message
 
+# Whisper resamples everything to 16kHz, so recording at a higher rate only adds bytes
+WHISPER_SAMPLE_RATE = 16000
+
+# Whisper API rejects uploads larger than 25MB
+WHISPER_MAX_FILE_BYTES = 25 * 1024 * 1024
+
+# Recordings quieter than this RMS level (int16 scale) are treated as silence
+SILENCE_RMS_THRESHOLD = 200
+
+# Recordings are uploaded as lossless FLAC, roughly half the size of the equivalent WAV
+RECORDING_FILENAME = 'recording.flac'
+
+# Spoken languages offered for transcription (ISO-639-1 codes); None lets Whisper detect it
+TRANSCRIPTION_LANGUAGES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'bn': 'Bengali',
+    'es': 'Spanish',
+    'fr': 'French',
+    'de': 'German',
+    None: 'Auto-detect',
+}
+DEFAULT_TRANSCRIPTION_LANGUAGE = 'en'
+
 class AudioProcessor:
     def __init__(self):
         self.recognizer = sr.Recognizer()
         self.microphone = None
         self.microphone_available = False
+        self.noise_calibrated = False
         
         # Initialize OpenAI client
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.openai_client = get_client()
         
         # Try to initialize microphone
         try:
             self.microphone = sr.Microphone()
             self.microphone_available = True
             
-            # Adjust for ambient noise
-            try:
-                with self.microphone as source:
-                    self.recognizer.adjust_for_ambient_noise(source, duration=1)
-            except Exception as e:
-                log_message(f"Warning: Could not adjust for ambient noise: {str(e)}")
+            # Ambient noise calibration blocks for a second, so it is deferred
+            # until the recognizer first listens (see _calibrate_ambient_noise)
                 
         except OSError as e:
             log_message(f"No audio input device available: {str(e)}")
@@ -34,84 +59,65 @@ class AudioProcessor:
             log_message(f"Error initializing microphone: {str(e)}")
             self.microphone_available = False
     
-    def record_audio(self, duration=5, sample_rate=44100):
+    def record_audio(self, duration=5, sample_rate=WHISPER_SAMPLE_RATE):
         """
         Record audio from microphone for specified duration
         
         Args:
             duration (int): Recording duration in seconds
-            sample_rate (int): Sample rate for recording
+            sample_rate (int): Sample rate for recording (defaults to Whisper's native 16kHz)
             
         Returns:
-            bytes: Audio data as bytes or None if failed
+            bytes: FLAC audio data as bytes or None if failed
+        """
+        recording = self.start_recording(duration, sample_rate)
+        return recording.result() if recording else None
+    
+    def start_recording(self, duration=5, sample_rate=WHISPER_SAMPLE_RATE):
+        """
+        Start recording from the microphone on a background thread
+        
+        Args:
+            duration (int): Maximum recording duration in seconds
+            sample_rate (int): Sample rate for recording (defaults to Whisper's native 16kHz)
+            
+        Returns:
+            AudioRecording: Running recording, or None if no microphone is available
         """
         if not self.microphone_available:
             log_message("Microphone not available for recording")
             return None
+        
+        return AudioRecording(duration, sample_rate).start()
+    
+    def speech_to_text(self, audio_file_path, language=DEFAULT_TRANSCRIPTION_LANGUAGE):
+        """
+        Convert speech in audio file to text using OpenAI Whisper
+        
+        Args:
+            audio_file_path (str): Path to audio file
+            language (str): ISO-639-1 code of the spoken language, or None to auto-detect
             
+        Returns:
+            str: Transcribed text or None if failed
+        """
         try:
-            # Audio recording parameters
-            chunk = 1024
-            format = pyaudio.paInt16
-            channels = 1
-            
-            # Initialize PyAudio
-            audio = pyaudio.PyAudio()
-            
-            # Open stream
-            stream = audio.open(
-                format=format,
-                channels=channels,
-                rate=sample_rate,
-                input=True,
-                frames_per_buffer=chunk
-            )
-            
-            log_message("Recording audio...")
-            frames = []
-            
-            # Record for specified duration
-            for _ in range(0, int(sample_rate / chunk * duration)):
-                data = stream.read(chunk)
-                frames.append(data)
-            
-            # Stop and close stream
-            stream.stop_stream()
-            stream.close()
-            audio.terminate()
-            
-            log_message("Audio recording completed")
-            
-            # Convert frames to bytes
-            audio_data = b''.join(frames)
-            
-            # Create WAV file data
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                with wave.open(temp_file.name, 'wb') as wf:
-                    wf.setnchannels(channels)
-                    wf.setsampwidth(audio.get_sample_size(format))
-                    wf.setframerate(sample_rate)
-                    wf.writeframes(audio_data)
-                
-                # Read the WAV file data
-                with open(temp_file.name, 'rb') as f:
-                    wav_data = f.read()
-                
-                # Clean up temporary file
-                os.unlink(temp_file.name)
-                
-                return wav_data
-                
-        except Exception as e:
-            log_message(f"Error recording audio: {str(e)}")
+            with open(audio_file_path, "rb") as audio_file:
+                audio_bytes = audio_file.read()
+        except OSError as e:
+            log_message(f"Error reading audio file: {str(e)}")
             return None
+        
+        return self.speech_to_text_bytes(audio_bytes, os.path.basename(audio_file_path), language)
     
-    def speech_to_text(self, audio_file_path):
+    def speech_to_text_bytes(self, audio_bytes, filename='audio.wav', language=DEFAULT_TRANSCRIPTION_LANGUAGE):
         """
-        Convert speech in audio file to text using OpenAI Whisper
+        Convert speech in in-memory audio data to text using OpenAI Whisper
         
         Args:
-            audio_file_path (str): Path to audio file
+            audio_bytes (bytes): Encoded audio data (WAV, MP3, M4A, OGG, ...)
+            filename (str): Name sent with the upload; its extension tells Whisper the format
+            language (str): ISO-639-1 code of the spoken language, or None to auto-detect
             
         Returns:
             str: Transcribed text or None if failed
@@ -119,15 +125,23 @@ class AudioProcessor:
         try:
             log_message("Starting speech-to-text conversion...")
             
-            with open(audio_file_path, "rb") as audio_file:
-                # Use OpenAI Whisper for transcription
-                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                # do not change this unless explicitly requested by the user
-                response = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            
+            # A known language skips Whisper's detection pass; temperature 0 avoids
+            # sampling fallbacks
+            options = {'temperature': 0}
+            if language:
+                options['language'] = language
+            
+            # Use OpenAI Whisper for transcription
+            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+            # do not change this unless explicitly requested by the user
+            response = self.openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, io.BytesIO(audio_bytes), content_type),
+                response_format="text",
+                **options
+            )
             
             transcribed_text = response.strip()
             log_message(f"Speech-to-text completed. Text length: {len(transcribed_text)} characters")
@@ -157,6 +171,8 @@ class AudioProcessor:
             
             if self.microphone is not None:
                 with self.microphone as source:
+                    self._calibrate_ambient_noise(source)
+                    
                     # Listen for audio input
                     audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=5)
                 
@@ -175,6 +191,24 @@ class AudioProcessor:
             log_message(f"Error in real-time speech recognition: {str(e)}")
             return None
     
+    def _calibrate_ambient_noise(self, source):
+        """
+        Adjust the recognizer's energy threshold for ambient noise, once per instance
+        
+        Args:
+            source: Open microphone source from speech_recognition
+        """
+        if self.noise_calibrated:
+            return
+        
+        try:
+            self.recognizer.adjust_for_ambient_noise(source, duration=1)
+        except Exception as e:
+            log_message(f"Warning: Could not adjust for ambient noise: {str(e)}")
+        
+        # Don't retry on failure; the default threshold is still usable
+        self.noise_calibrated = True
+    
     def _fallback_whisper_recognition(self, audio_data):
         """
         Fallback method using OpenAI Whisper for speech recognition
@@ -186,21 +220,9 @@ class AudioProcessor:
             str: Transcribed text or None if failed
         """
         try:
-            # Convert AudioData to WAV format
+            # Convert AudioData to WAV format and transcribe it directly from memory
             wav_data = audio_data.get_wav_data()
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_file.write(wav_data)
-                temp_file_path = temp_file.name
-            
-            # Use Whisper for transcription
-            result = self.speech_to_text(temp_file_path)
-            
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
-            return result
+            return self.speech_to_text_bytes(wav_data)
             
         except Exception as e:
             log_message(f"Error in Whisper fallback recognition: {str(e)}")
@@ -219,6 +241,8 @@ class AudioProcessor:
         try:
             if self.microphone is not None:
                 with self.microphone as source:
+                    self._calibrate_ambient_noise(source)
+                    
                     # Try to capture a short audio sample
                     audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=1)
                     return True
@@ -227,3 +251,157 @@ class AudioProcessor:
         except Exception as e:
             log_message(f"Microphone test failed: {str(e)}")
             return False
+
+
+class AudioRecording:
+    """
+    Microphone capture running on a background thread
+    
+    The worker thread queues raw PCM chunks as they arrive, so the UI can poll
+    progress and stop early. result() waits for the thread and assembles the
+    queued chunks into FLAC data.
+    """
+    
+    def __init__(self, duration, sample_rate, chunk=1024, channels=1):
+        self.sample_rate = sample_rate
+        self.chunk = chunk
+        self.channels = channels
+        self.format = pyaudio.paInt16
+        self.total_chunks = max(1, int(sample_rate / chunk * duration))
+        self.chunks_captured = 0
+        
+        self._chunks = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._capture, name="audio-recording", daemon=True)
+        self._wav_data = None
+        self._finished = False
+        
+        # Zero-copy int16 view of the recorded samples, available after result()
+        self.samples = np.empty(0, dtype=np.int16)
+    
+    def start(self):
+        """
+        Start the capture thread
+        
+        Returns:
+            AudioRecording: This recording, for chaining
+        """
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """
+        Ask the capture thread to stop after the chunk it is currently reading
+        """
+        self._stop_event.set()
+    
+    @property
+    def is_recording(self):
+        """
+        bool: True while the capture thread is still running
+        """
+        return self._thread.is_alive()
+    
+    @property
+    def progress(self):
+        """
+        float: Fraction of the maximum duration captured so far (0.0 to 1.0)
+        """
+        return min(self.chunks_captured / self.total_chunks, 1.0)
+    
+    @property
+    def rms(self):
+        """
+        float: Root-mean-square amplitude of the recorded samples (0 if none)
+        """
+        if self.samples.size == 0:
+            return 0.0
+        return float(np.sqrt(np.mean(np.square(self.samples, dtype=np.float32))))
+    
+    @property
+    def is_silent(self):
+        """
+        bool: True if the recording is too quiet to contain speech worth transcribing
+        """
+        return self.rms < SILENCE_RMS_THRESHOLD
+    
+    def result(self, timeout=None):
+        """
+        Wait for the capture to finish and return the recorded audio
+        
+        Args:
+            timeout (float): Maximum seconds to wait, or None to wait until done
+            
+        Returns:
+            bytes: FLAC audio data, or None if nothing was recorded
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return None
+        
+        if not self._finished:
+            self._wav_data = self._assemble()
+            self._finished = True
+        
+        return self._wav_data
+    
+    def _capture(self):
+        """
+        Read chunks from the microphone until the duration elapses or stop() is called
+        """
+        audio = pyaudio.PyAudio()
+        
+        try:
+            stream = audio.open(
+                format=self.format,
+                channels=self.channels,
+                rate=self.sample_rate,
+                input=True,
+                frames_per_buffer=self.chunk
+            )
+            
+            log_message("Recording audio...")
+            
+            try:
+                for _ in range(self.total_chunks):
+                    if self._stop_event.is_set():
+                        break
+                    self._chunks.put(stream.read(self.chunk))
+                    self.chunks_captured += 1
+            finally:
+                stream.stop_stream()
+                stream.close()
+            
+            log_message("Audio recording completed")
+            
+        except Exception as e:
+            log_message(f"Error recording audio: {str(e)}")
+        finally:
+            audio.terminate()
+    
+    def _assemble(self):
+        """
+        Drain the queued chunks into one buffer and encode it as 16-bit FLAC
+        
+        Returns:
+            bytes: FLAC audio data, or None if no chunks were captured
+        """
+        num_chunks = self._chunks.qsize()
+        if num_chunks == 0:
+            return None
+        
+        # Preallocate one contiguous buffer and copy each chunk into place
+        sample_width = pyaudio.get_sample_size(self.format)
+        chunk_bytes = self.chunk * self.channels * sample_width
+        audio_data = bytearray(num_chunks * chunk_bytes)
+        view = memoryview(audio_data)
+        for offset in range(0, len(audio_data), chunk_bytes):
+            view[offset:offset + chunk_bytes] = self._chunks.get_nowait()
+        view.release()
+        
+        # Encode FLAC in memory from an int16 view of the buffer
+        self.samples = np.frombuffer(audio_data, dtype=np.int16)
+        buffer = io.BytesIO()
+        sf.write(buffer, self.samples.reshape(-1, self.channels), self.sample_rate, format='FLAC', subtype='PCM_16')
+        
+        return buffer.getvalue()
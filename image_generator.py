@@ -1,11 +1,55 @@
-import os
+import io
+import asyncio
+import aiohttp
 import requests
-from openai import OpenAI
-from utils import log_message
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image
+from openai_client import get_async_client, get_client
+from keyword_matcher import KeywordMatcher
+from utils import log_enabled, log_message, run_coroutine
+
+# Pooled HTTP session so repeated image downloads reuse TCP/TLS connections,
+# retrying transient failures with backoff
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504))
+))
+
+# Largest source image accepted for variations (DALL-E's own upload limit)
+MAX_SOURCE_IMAGE_BYTES = 4 * 1024 * 1024
+
+# Words that commonly trip DALL-E's content policy
+PROBLEMATIC_WORDS = [
+    'violence', 'weapon', 'blood', 'death', 'kill', 
+    'nude', 'naked', 'sexual', 'explicit'
+]
+
+# Style, lighting and composition terms that mark a prompt as already detailed
+STYLE_TERMS = [
+    'cinematic', 'photorealistic', 'hyperrealistic', 'studio lighting',
+    'soft lighting', 'dramatic lighting', 'volumetric lighting', 'golden hour',
+    'rim light', 'backlit', 'depth of field', 'bokeh', '35mm', '85mm',
+    'wide angle', 'close-up', 'macro', 'aerial view', 'composition',
+    'rule of thirds', 'color palette', 'watercolor', 'oil painting',
+    'digital art', 'concept art', 'illustration', 'highly detailed',
+    'sharp focus', '4k', '8k', 'octane render', 'unreal engine'
+]
+
+# Prompts with at least this many style terms and more than this many words
+# are sent to DALL-E as they are, without an enhancement round-trip
+ENHANCE_SKIP_MIN_STYLE_TERMS = 3
+ENHANCE_SKIP_MIN_WORDS = 30
+
+# One automaton for prompt validation and the enhancement heuristic
+_prompt_matcher = KeywordMatcher({'problematic': PROBLEMATIC_WORDS, 'style': STYLE_TERMS})
 
 class ImageGenerator:
     def __init__(self):
-        self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.openai_client = get_client()
+        self.async_openai_client = get_async_client()
     
     def generate_image(self, prompt, size="1024x1024", quality="standard"):
         """
@@ -20,71 +64,258 @@ class ImageGenerator:
             dict: Result containing success status, URL, and error message if any
         """
         try:
-            log_message(f"Generating image for prompt: {prompt[:100]}...")
+            if log_enabled():
+                log_message(f"Generating image for prompt: {prompt[:100]}...")
             
-            # Validate prompt
-            if not prompt or len(prompt.strip()) == 0:
+            request = self._image_request(prompt, size, quality)
+            if request is None:
                 return {
                     'success': False,
                     'error': 'Prompt cannot be empty',
                     'url': None
                 }
             
-            # Check prompt length (DALL-E 3 has a limit)
-            if len(prompt) > 4000:
-                prompt = prompt[:4000]
-                log_message("Prompt truncated to 4000 characters")
-            
-            # Generate image using DALL-E 3
-            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            # do not change this unless explicitly requested by the user
-            response = self.openai_client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size=size,
-                quality=quality,
-                n=1,
-            )
-            
-            image_url = response.data[0].url
-            log_message("Image generated successfully")
-            
-            return {
-                'success': True,
-                'url': image_url,
-                'error': None,
-                'revised_prompt': getattr(response.data[0], 'revised_prompt', None)
-            }
+            response = self.openai_client.images.generate(**request)
+            return self._image_result(response)
             
         except Exception as e:
-            error_message = str(e)
-            log_message(f"Error generating image: {error_message}")
+            return self._image_error(e)
+    
+    async def agenerate_image(self, prompt, size="1024x1024", quality="standard"):
+        """
+        Async variant of generate_image for use with asyncio.gather
+        
+        Args:
+            prompt (str): Text description for image generation
+            size (str): Image size (256x256, 512x512, 1024x1024)
+            quality (str): Image quality (standard, hd)
             
-            # Check for specific error types
-            if "content_policy_violation" in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'Content violates OpenAI policy. Please try a different prompt.',
-                    'url': None
-                }
-            elif "billing" in error_message.lower() or "quota" in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'API quota exceeded or billing issue. Please check your OpenAI account.',
-                    'url': None
-                }
-            elif "rate_limit" in error_message.lower():
-                return {
-                    'success': False,
-                    'error': 'Rate limit exceeded. Please wait a moment and try again.',
-                    'url': None
-                }
-            else:
+        Returns:
+            dict: Result containing success status, URL, and error message if any
+        """
+        try:
+            if log_enabled():
+                log_message(f"Generating image for prompt: {prompt[:100]}...")
+            
+            request = self._image_request(prompt, size, quality)
+            if request is None:
                 return {
                     'success': False,
-                    'error': f'Image generation failed: {error_message}',
+                    'error': 'Prompt cannot be empty',
                     'url': None
                 }
+            
+            response = await self.async_openai_client.images.generate(**request)
+            return self._image_result(response)
+            
+        except Exception as e:
+            return self._image_error(e)
+    
+    async def agenerate_images(self, prompts, size="1024x1024", quality="standard"):
+        """
+        Generate one image per prompt with all requests in flight at once
+        
+        Args:
+            prompts (list): Text descriptions for image generation
+            size (str): Image size (256x256, 512x512, 1024x1024)
+            quality (str): Image quality (standard, hd)
+            
+        Returns:
+            list: Result dict for each prompt, in the same order
+        """
+        return await asyncio.gather(*(self.agenerate_image(prompt, size, quality) for prompt in prompts))
+    
+    def _image_request(self, prompt, size, quality):
+        """
+        Validate a prompt and build the DALL-E request for it
+        
+        Args:
+            prompt (str): Text description for image generation
+            size (str): Image size
+            quality (str): Image quality
+            
+        Returns:
+            dict: Keyword arguments for images.generate, or None if the prompt is empty
+        """
+        # Validate prompt
+        if not prompt or len(prompt.strip()) == 0:
+            return None
+        
+        # Check prompt length (DALL-E 3 has a limit)
+        if len(prompt) > 4000:
+            prompt = prompt[:4000]
+            log_message("Prompt truncated to 4000 characters")
+        
+        # Generate image using DALL-E 3
+        # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+        # do not change this unless explicitly requested by the user
+        return dict(
+            model="dall-e-3",
+            prompt=prompt,
+            size=size,
+            quality=quality,
+            n=1,
+        )
+    
+    def _image_result(self, response):
+        """
+        Build the success result from a DALL-E response
+        
+        Args:
+            response: images.generate response
+            
+        Returns:
+            dict: Result containing the image URL and revised prompt
+        """
+        image_url = response.data[0].url
+        log_message("Image generated successfully")
+        
+        return {
+            'success': True,
+            'url': image_url,
+            'error': None,
+            'revised_prompt': getattr(response.data[0], 'revised_prompt', None)
+        }
+    
+    def _image_error(self, error):
+        """
+        Map an image generation failure to a user-facing result
+        
+        Args:
+            error (Exception): The failure
+            
+        Returns:
+            dict: Failed result with a readable error message
+        """
+        error_message = str(error)
+        log_message(f"Error generating image: {error_message}")
+        
+        # Check for specific error types
+        if "content_policy_violation" in error_message.lower():
+            return {
+                'success': False,
+                'error': 'Content violates OpenAI policy. Please try a different prompt.',
+                'url': None
+            }
+        elif "billing" in error_message.lower() or "quota" in error_message.lower():
+            return {
+                'success': False,
+                'error': 'API quota exceeded or billing issue. Please check your OpenAI account.',
+                'url': None
+            }
+        elif "rate_limit" in error_message.lower():
+            return {
+                'success': False,
+                'error': 'Rate limit exceeded. Please wait a moment and try again.',
+                'url': None
+            }
+        else:
+            return {
+                'success': False,
+                'error': f'Image generation failed: {error_message}',
+                'url': None
+            }
+    
+    def download_image(self, image_url, timeout=30):
+        """
+        Download a generated image over the pooled HTTP session
+        
+        Args:
+            image_url (str): URL of the generated image
+            timeout (int): Request timeout in seconds
+            
+        Returns:
+            PIL.Image: Fully loaded image
+        """
+        with _http.get(image_url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            
+            # Decode straight from the response stream, then load the pixels
+            # before the connection goes back to the pool
+            image = Image.open(response.raw)
+            image.load()
+        
+        return image
+    
+    def download_images(self, image_urls, max_concurrency=8, timeout=30):
+        """
+        Download several generated images concurrently
+        
+        Args:
+            image_urls (list): URLs of the generated images
+            max_concurrency (int): Maximum number of downloads in flight at once
+            timeout (int): Per-download timeout in seconds
+            
+        Returns:
+            list: PIL.Image for each URL in order, or None where the download failed
+        """
+        log_message(f"Downloading {len(image_urls)} images...")
+        return run_coroutine(self._fetch_many(image_urls, max_concurrency, timeout))
+    
+    async def _fetch_many(self, image_urls, max_concurrency, timeout):
+        """
+        Fetch and decode images with bounded concurrency
+        
+        Args:
+            image_urls (list): URLs of the images
+            max_concurrency (int): Maximum number of downloads in flight at once
+            timeout (int): Per-download timeout in seconds
+            
+        Returns:
+            list: PIL.Image or None for each URL
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async def fetch(url):
+                async with semaphore:
+                    try:
+                        data = await self._fetch_bytes(session, url)
+                        image = Image.open(io.BytesIO(data))
+                        image.load()
+                        return image
+                    
+                    except Exception as e:
+                        # One failed download should not discard the others
+                        log_message(f"Error downloading image: {str(e)}", 'warning')
+                        return None
+            
+            return await asyncio.gather(*(fetch(url) for url in image_urls))
+    
+    async def _fetch_bytes(self, session, url, max_bytes=None):
+        """
+        Stream a response body into memory, optionally refusing oversized bodies
+        
+        Args:
+            session (aiohttp.ClientSession): Session to fetch with
+            url (str): URL to fetch
+            max_bytes (int): Largest body accepted, or None for no limit
+            
+        Returns:
+            bytes: Response body
+            
+        Raises:
+            ValueError: If the body is larger than max_bytes
+        """
+        async with session.get(url) as response:
+            response.raise_for_status()
+            
+            if max_bytes is None:
+                return await response.read()
+            
+            # Reject early on the declared size, then enforce the cap while streaming
+            # in case the header is missing or wrong
+            if int(response.headers.get('Content-Length', 0)) > max_bytes:
+                raise ValueError('Image is too large')
+            
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > max_bytes:
+                    raise ValueError('Image is too large')
+            
+            return bytes(data)
     
     def enhance_prompt(self, basic_prompt):
         """
@@ -96,24 +327,44 @@ class ImageGenerator:
         Returns:
             str: Enhanced prompt with artistic details
         """
+        if self._is_detailed_prompt(basic_prompt):
+            log_message("Prompt already detailed; skipping enhancement")
+            return basic_prompt
+        
         try:
             log_message("Enhancing prompt for better results...")
             
-            enhancement_request = f"""
-            Enhance this image prompt to be more detailed and artistic while keeping the core meaning:
-            "{basic_prompt}"
-            
-            Add artistic style, lighting, composition details but keep it under 200 words.
-            Make it suitable for DALL-E image generation.
-            """
-            
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an expert at writing prompts for AI image generation. Create detailed, artistic prompts that will produce high-quality images."},
-                    {"role": "user", "content": enhancement_request}
-                ],
-                max_tokens=200
+            response = self.openai_client.chat.completions.create(**self._enhancement_request(basic_prompt))
+            
+            enhanced_prompt = response.choices[0].message.content.strip()
+            log_message("Prompt enhanced successfully")
+            
+            return enhanced_prompt
+            
+        except Exception as e:
+            log_message(f"Error enhancing prompt: {str(e)}")
+            # Return original prompt if enhancement fails
+            return basic_prompt
+    
+    async def aenhance_prompt(self, basic_prompt):
+        """
+        Async variant of enhance_prompt for use with asyncio.gather
+        
+        Args:
+            basic_prompt (str): Basic text prompt
+            
+        Returns:
+            str: Enhanced prompt with artistic details
+        """
+        if self._is_detailed_prompt(basic_prompt):
+            log_message("Prompt already detailed; skipping enhancement")
+            return basic_prompt
+        
+        try:
+            log_message("Enhancing prompt for better results...")
+            
+            response = await self.async_openai_client.chat.completions.create(
+                **self._enhancement_request(basic_prompt)
             )
             
             enhanced_prompt = response.choices[0].message.content.strip()
@@ -126,6 +377,49 @@ class ImageGenerator:
             # Return original prompt if enhancement fails
             return basic_prompt
     
+    def _is_detailed_prompt(self, prompt):
+        """
+        Check whether a prompt is already rich enough to skip enhancement
+        
+        Args:
+            prompt (str): Text prompt
+            
+        Returns:
+            bool: True if the prompt is long and uses several style terms
+        """
+        if len(prompt.split()) <= ENHANCE_SKIP_MIN_WORDS:
+            return False
+        
+        style_terms = _prompt_matcher.find(prompt.lower()).get('style', set())
+        return len(style_terms) >= ENHANCE_SKIP_MIN_STYLE_TERMS
+    
+    def _enhancement_request(self, basic_prompt):
+        """
+        Build the chat request that rewrites a prompt with artistic detail
+        
+        Args:
+            basic_prompt (str): Basic text prompt
+            
+        Returns:
+            dict: Keyword arguments for chat.completions.create
+        """
+        enhancement_request = f"""
+        Enhance this image prompt to be more detailed and artistic while keeping the core meaning:
+        "{basic_prompt}"
+        
+        Add artistic style, lighting, composition details but keep it under 200 words.
+        Make it suitable for DALL-E image generation.
+        """
+        
+        return dict(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are an expert at writing prompts for AI image generation. Create detailed, artistic prompts that will produce high-quality images."},
+                {"role": "user", "content": enhancement_request}
+            ],
+            max_tokens=200
+        )
+    
     def generate_variations(self, image_url, n=1):
         """
         Generate variations of an existing image
@@ -140,14 +434,73 @@ class ImageGenerator:
         try:
             log_message(f"Generating {n} variations of image...")
             
-            # Download the source image
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                return {
-                    'success': False,
-                    'error': 'Could not download source image',
-                    'urls': []
-                }
+            # Check the source image over the pooled session; the body is only
+            # streamed in once it is actually needed
+            with _http.get(image_url, stream=True, timeout=10) as response:
+                if response.status_code != 200:
+                    return {
+                        'success': False,
+                        'error': 'Could not download source image',
+                        'urls': []
+                    }
+                
+                content_length = int(response.headers.get('Content-Length', 0))
+                if content_length > MAX_SOURCE_IMAGE_BYTES:
+                    return {
+                        'success': False,
+                        'error': 'Source image is too large',
+                        'urls': []
+                    }
+            
+            # Note: DALL-E 3 doesn't support variations directly
+            # This would require DALL-E 2 or a different approach
+            log_message("Image variations not supported with DALL-E 3")
+            
+            return {
+                'success': False,
+                'error': 'Image variations not supported with current model',
+                'urls': []
+            }
+            
+        except Exception as e:
+            log_message(f"Error generating variations: {str(e)}")
+            return {
+                'success': False,
+                'error': f'Variation generation failed: {str(e)}',
+                'urls': []
+            }
+    
+    async def agenerate_variations(self, image_url, n=1):
+        """
+        Async variant of generate_variations; the source image is streamed with
+        aiohttp so many variation requests can be gathered on one event loop
+        
+        Args:
+            image_url (str): URL of the source image
+            n (int): Number of variations to generate (1-4)
+            
+        Returns:
+            dict: Result containing success status and variation URLs
+        """
+        try:
+            log_message(f"Generating {n} variations of image...")
+            
+            # Download the source image, refusing anything over the upload limit
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+                try:
+                    await self._fetch_bytes(session, image_url, MAX_SOURCE_IMAGE_BYTES)
+                except aiohttp.ClientResponseError:
+                    return {
+                        'success': False,
+                        'error': 'Could not download source image',
+                        'urls': []
+                    }
+                except ValueError:
+                    return {
+                        'success': False,
+                        'error': 'Source image is too large',
+                        'urls': []
+                    }
             
             # Note: DALL-E 3 doesn't support variations directly
             # This would require DALL-E 2 or a different approach
@@ -191,13 +544,8 @@ class ImageGenerator:
                 recommendations.append("Reduce prompt length to under 4000 characters")
             
             # Check for potentially problematic content
-            problematic_words = [
-                'violence', 'weapon', 'blood', 'death', 'kill', 
-                'nude', 'naked', 'sexual', 'explicit'
-            ]
-            
-            prompt_lower = prompt.lower()
-            found_issues = [word for word in problematic_words if word in prompt_lower]
+            matched_words = _prompt_matcher.find(prompt.lower()).get('problematic', set())
+            found_issues = [word for word in PROBLEMATIC_WORDS if word in matched_words]
             
             if found_issues:
                 validation_issues.append(f"Potentially problematic content: {', '.join(found_issues)}")
@@ -0,0 +1,87 @@
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    # Fall back to precompiled regular expressions (see _build_patterns)
+    ahocorasick = None
+
+class KeywordMatcher:
+    """
+    Substring matcher for several categories of keywords at once
+
+    Every keyword is compiled into a single Aho-Corasick automaton, so a text
+    is scanned once no matter how many keywords or categories there are.
+    Without pyahocorasick, each category is compiled into one regex
+    alternation instead, so a text is scanned once per category.
+    """
+
+    def __init__(self, categories):
+        """
+        Build the automaton for the given keyword categories
+
+        Args:
+            categories (dict): Mapping of category name to a list of lowercase keywords
+        """
+        self.categories = {category: list(words) for category, words in categories.items()}
+
+        if ahocorasick is None:
+            self._automaton = None
+            self._patterns = self._build_patterns()
+            return
+
+        self._automaton = ahocorasick.Automaton()
+        for category, words in self.categories.items():
+            for word in words:
+                # A keyword may appear in more than one category
+                _, word_categories = self._automaton.get(word, (word, ()))
+                self._automaton.add_word(word, (word, word_categories + (category,)))
+        self._automaton.make_automaton()
+
+    def _build_patterns(self):
+        """
+        Compile one regex per category for use without pyahocorasick
+
+        The alternation sits inside a lookahead so keywords that overlap in the
+        text are all found. When two keywords of a category start at the same
+        index only the longer one is reported, which never changes whether
+        the category matched.
+
+        Returns:
+            dict: Category name to compiled pattern, for non-empty categories only
+        """
+        patterns = {}
+        for category, words in self.categories.items():
+            if not words:
+                continue
+            alternation = '|'.join(re.escape(word) for word in sorted(set(words), key=len, reverse=True))
+            patterns[category] = re.compile(f'(?=({alternation}))')
+        return patterns
+
+    def find(self, text_lower):
+        """
+        Find every keyword that occurs in a text
+
+        Args:
+            text_lower (str): Lowercased text to scan
+
+        Returns:
+            dict: Category name to set of matched keywords, for categories with matches only
+        """
+        hits = {}
+
+        if self._automaton is None:
+            for category, pattern in self._patterns.items():
+                words = set(pattern.findall(text_lower))
+                if words:
+                    hits[category] = words
+            return hits
+
+        if len(self._automaton) == 0:
+            return hits
+
+        for _, (word, word_categories) in self._automaton.iter(text_lower):
+            for category in word_categories:
+                hits.setdefault(category, set()).add(word)
+
+        return hits
@@ -0,0 +1,37 @@
+import os
+from functools import lru_cache
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# Connection pool limits shared by the sync and async clients
+_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+@lru_cache(maxsize=None)
+def get_client():
+    """
+    Get the OpenAI client shared by every module in the app
+
+    One client means one HTTP connection pool, so moderation, transcription,
+    image generation and prompt enhancement calls reuse warm keep-alive
+    (and HTTP/2) connections instead of each paying its own TLS handshake.
+
+    Returns:
+        OpenAI: Shared OpenAI client
+    """
+    http_client = DefaultHttpxClient(http2=True, limits=_POOL_LIMITS)
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+
+@lru_cache(maxsize=None)
+def get_async_client():
+    """
+    Get the AsyncOpenAI client shared by every module in the app
+
+    Its connections belong to one event loop, so coroutines using it must be
+    run through utils.run_coroutine rather than asyncio.run.
+
+    Returns:
+        AsyncOpenAI: Shared async OpenAI client
+    """
+    http_client = DefaultAsyncHttpxClient(http2=True, limits=_POOL_LIMITS)
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
@@ -0,0 +1,51 @@
+import asyncio
+
+from utils import log_message
+
+async def moderate_and_generate(text, moderator, generator, size="1024x1024", quality="standard"):
+    """
+    Moderate a prompt and enhance it concurrently, then generate the image
+
+    Enhancement does not depend on the moderation verdict, so both requests
+    are in flight at once. The enhanced prompt is what DALL-E receives, so it
+    is moderated too before generation.
+
+    Args:
+        text (str): User prompt
+        moderator (ContentModerator): Moderator used for the text checks
+        generator (ImageGenerator): Generator used for enhancement and DALL-E
+        size (str): Image size
+        quality (str): Image quality
+
+    Returns:
+        dict: 'moderation' result (the first failing one, if any), 'prompt'
+              actually sent to DALL-E, and 'image' result (None if blocked)
+    """
+    moderation_task = asyncio.create_task(moderator.amoderate_text(text))
+    enhancement_task = asyncio.create_task(generator.aenhance_prompt(text))
+    moderation_result, enhanced_prompt = await asyncio.gather(moderation_task, enhancement_task)
+
+    if moderation_result['is_safe']:
+        # The original text's verdict is cached by now, so this batch only sends
+        # the enhanced prompt to the API (and nothing if enhancement was skipped)
+        moderation_results = await moderator.amoderate_texts([text, enhanced_prompt])
+        moderation_result = next(
+            (result for result in moderation_results if not result['is_safe']),
+            moderation_result
+        )
+
+    if not moderation_result['is_safe']:
+        log_message("Pipeline stopped: prompt failed moderation")
+        return {
+            'moderation': moderation_result,
+            'prompt': enhanced_prompt,
+            'image': None
+        }
+
+    image_result = await generator.agenerate_image(enhanced_prompt, size, quality)
+
+    return {
+        'moderation': moderation_result,
+        'prompt': enhanced_prompt,
+        'image': image_result
+    }
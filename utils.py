@@ -1,8 +1,24 @@
 import os
+import io
+import re
+import sys
+import hashlib
+import platform
 import tempfile
 import time
 import logging
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from PIL import Image
+
+try:
+    import pyaudio
+except ImportError:
+    # Microphone checks report no access when PyAudio is not installed
+    pyaudio = None
 
 # Configure logging
 logging.basicConfig(
@@ -14,6 +30,38 @@ logging.basicConfig(
     ]
 )
 
+_LOGGER = logging.getLogger(__name__)
+
+# log_message level names mapped to logger methods (unknown levels log as info)
+_LEVELS = {
+    'info': _LOGGER.info,
+    'warning': _LOGGER.warning,
+    'error': _LOGGER.error,
+    'debug': _LOGGER.debug
+}
+_LEVEL_NUMBERS = {
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'debug': logging.DEBUG
+}
+
+# Characters that are not allowed in filenames on common platforms
+_UNSAFE_FN = re.compile(r'[<>:"/\\|?*]')
+
+# Units used by format_file_size
+_SIZE_NAMES = ("B", "KB", "MB", "GB")
+
+# Audio file extensions accepted for transcription
+_SUPPORTED_AUDIO_FORMATS = ('.wav', '.mp3', '.m4a', '.ogg', '.flac', '.aac')
+
+# Shared worker pool for network calls that can overlap with the UI script
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+# Long-lived event loop for async API clients, started on first use
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
 def log_message(message, level='info'):
     """
     Log a message with timestamp
@@ -22,18 +70,55 @@ def log_message(message, level='info'):
         message (str): Message to log
         level (str): Log level (info, warning, error, debug)
     """
-    logger = logging.getLogger(__name__)
+    _LEVELS.get(level.lower(), _LOGGER.info)(message)
+
+def log_enabled(level='info'):
+    """
+    Check whether a log level is enabled, so callers can skip building messages
     
-    if level.lower() == 'info':
-        logger.info(message)
-    elif level.lower() == 'warning':
-        logger.warning(message)
-    elif level.lower() == 'error':
-        logger.error(message)
-    elif level.lower() == 'debug':
-        logger.debug(message)
-    else:
-        logger.info(message)
+    Args:
+        level (str): Log level (info, warning, error, debug)
+        
+    Returns:
+        bool: True if messages at this level would be emitted
+    """
+    return _LOGGER.isEnabledFor(_LEVEL_NUMBERS.get(level.lower(), logging.INFO))
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Run a function on the shared worker pool
+    
+    Args:
+        func (callable): Function to run
+        *args: Positional arguments for the function
+        **kwargs: Keyword arguments for the function
+        
+    Returns:
+        concurrent.futures.Future: Future resolving to the function's return value
+    """
+    return _executor.submit(func, *args, **kwargs)
+
+def run_coroutine(coro):
+    """
+    Run a coroutine on the shared background event loop and wait for its result
+    
+    Unlike asyncio.run, the loop outlives each call, so async clients and their
+    connection pools can be reused across calls and sessions.
+    
+    Args:
+        coro (coroutine): Coroutine to run
+        
+    Returns:
+        The coroutine's return value
+    """
+    global _event_loop
+    
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="event-loop", daemon=True).start()
+    
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop).result()
 
 def save_audio_file(audio_data, file_extension='.wav'):
     """
@@ -64,6 +149,84 @@ def save_audio_file(audio_data, file_extension='.wav'):
         log_message(f"Error saving audio file: {str(e)}", 'error')
         raise
 
+@contextmanager
+def temp_audio_file(audio_data, file_extension='.wav'):
+    """
+    Save audio data to a temporary file that is deleted when the block exits
+    
+    Args:
+        audio_data (bytes): Audio data as bytes
+        file_extension (str): File extension for the audio file
+        
+    Yields:
+        str: Path to the temporary file, valid inside the with block
+    """
+    file_path = save_audio_file(audio_data, file_extension)
+    try:
+        yield file_path
+    finally:
+        try:
+            os.unlink(file_path)
+        except OSError:
+            pass
+
+def encode_image(image, image_format='WEBP', quality=85):
+    """
+    Encode a PIL image into compressed bytes
+    
+    Args:
+        image (PIL.Image): Image to encode
+        image_format (str): Target format (WEBP, JPEG, PNG, ...)
+        quality (int): Encoder quality for lossy formats
+        
+    Returns:
+        bytes: Encoded image data
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+def encode_thumbnail(image, max_size=(256, 256), image_format='WEBP', quality=85):
+    """
+    Encode a downscaled copy of a PIL image, leaving the original untouched
+    
+    Args:
+        image (PIL.Image): Image to shrink
+        max_size (tuple): Maximum (width, height) of the thumbnail
+        image_format (str): Target format (WEBP, JPEG, PNG, ...)
+        quality (int): Encoder quality for lossy formats
+        
+    Returns:
+        bytes: Encoded thumbnail data
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return encode_image(thumbnail, image_format, quality)
+
+def hash_bytes(data):
+    """
+    Compute a short, stable digest of binary data for use as a cache key
+    
+    Args:
+        data (bytes): Data to hash
+        
+    Returns:
+        str: 32-character hex digest
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def normalize_prompt(text):
+    """
+    Normalize a prompt for use as a cache key
+    
+    Args:
+        text (str): Prompt text
+        
+    Returns:
+        str: Lowercased prompt with whitespace collapsed to single spaces
+    """
+    return " ".join(text.lower().split())
+
 def display_error(error_message, error_type="Error"):
     """
     Format error message for display
@@ -117,23 +280,35 @@ def format_file_size(size_bytes):
     if size_bytes == 0:
         return "0B"
     
-    size_names = ["B", "KB", "MB", "GB"]
+    size_value, size_name = _unit_and_value(size_bytes)
+    return f"{size_value:.1f}{size_name}"
+
+def _unit_and_value(size_bytes):
+    """
+    Scale a byte count to the largest unit that keeps it at or above 1
+    
+    Args:
+        size_bytes (int): Size in bytes
+        
+    Returns:
+        tuple: (scaled size, unit name)
+    """
     i = 0
     
-    while size_bytes >= 1024 and i < len(size_names) - 1:
+    while size_bytes >= 1024 and i < len(_SIZE_NAMES) - 1:
         size_bytes /= 1024.0
         i += 1
     
-    return f"{size_bytes:.1f}{size_names[i]}"
+    return size_bytes, _SIZE_NAMES[i]
 
 def get_supported_audio_formats():
     """
     Get list of supported audio formats
     
     Returns:
-        list: List of supported audio file extensions
+        tuple: Supported audio file extensions
     """
-    return ['.wav', '.mp3', '.m4a', '.ogg', '.flac', '.aac']
+    return _SUPPORTED_AUDIO_FORMATS
 
 def cleanup_temp_files(file_paths):
     """
@@ -144,9 +319,11 @@ def cleanup_temp_files(file_paths):
     """
     for file_path in file_paths:
         try:
-            if os.path.exists(file_path):
-                os.unlink(file_path)
-                log_message(f"Cleaned up temporary file: {file_path}")
+            # Unlink directly; a missing file is already cleaned up
+            os.unlink(file_path)
+            log_message(f"Cleaned up temporary file: {file_path}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             log_message(f"Error cleaning up file {file_path}: {str(e)}", 'warning')
 
@@ -181,10 +358,8 @@ def safe_filename(filename):
     Returns:
         str: Safe filename
     """
-    import re
-    
     # Remove or replace unsafe characters
-    safe_name = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    safe_name = _UNSAFE_FN.sub('_', filename)
     
     # Remove leading/trailing spaces and dots
     safe_name = safe_name.strip(' .')
@@ -202,9 +377,11 @@ def check_microphone_permissions():
     Returns:
         bool: True if microphone is accessible, False otherwise
     """
+    if pyaudio is None:
+        log_message("Microphone permission check failed: PyAudio is not installed", 'error')
+        return False
+    
     try:
-        import pyaudio
-        
         # Try to initialize PyAudio
         audio = pyaudio.PyAudio()
         
@@ -257,9 +434,6 @@ def get_system_info():
     Returns:
         dict: System information
     """
-    import platform
-    import sys
-    
     return {
         'platform': platform.platform(),
         'python_version': sys.version,